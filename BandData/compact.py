@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import os
+from User.defaults import ENERGY_DTYPE_NAMES
+
+ENERGY_DTYPES = {name: getattr(np, name) for name in ENERGY_DTYPE_NAMES}
+K_TOLERANCE = 1e-4  # Largest distance allowed between a k point and its segment line, in the units of the CSV files
+
+
+class CompactBandStructure:
+    """
+    This class represents band structure data along a k-space path in compact form.
+    Within a segment every k point lies on the line between the segment endpoints, so each row is stored as
+    a single path parameter t (k = k0 + t * (kf - k0)) and an eigenvalue, both float32 by default.
+    Cartesian k values are only computed when requested.
+    """
+    def __init__(self, k0, kf, segment_lengths, t, E):
+        """
+        :param k0: An (n_segments, 3) array of the initial k-vector of each segment.
+        :param kf: An (n_segments, 3) array of the final k-vector of each segment.
+        :param segment_lengths: Number of rows belonging to each segment, the rows of a segment being contiguous.
+        :param t: Path parameter of each row, 0 at the start and 1 at the end of its segment.
+        :param E: Eigenvalue of each row.
+        """
+        self.k0 = np.asarray(k0, dtype=np.float64).reshape(-1, 3)
+        self.kf = np.asarray(kf, dtype=np.float64).reshape(-1, 3)
+        self.segment_lengths = np.asarray(segment_lengths, dtype=np.int64)
+        self.t = np.asarray(t)
+        self.E = np.asarray(E)
+
+    @classmethod
+    def from_segment_frames(cls, frames, k_pairs, energy_dtype=np.float32):
+        """
+        Builds the compact representation from one DataFrame of kx, ky, kz and E per segment.
+        Frames are consumed one at a time, so a generator keeps only a single segment in memory at full precision.
+
+        :param frames: An iterable of DataFrames, one for each segment in path order.
+        :param k_pairs: A list of (initial_k, final_k) tuples, one for each segment.
+        :param energy_dtype: The dtype the eigenvalues are stored with.
+        :return: A CompactBandStructure instance.
+        :raises: ValueError if a k point is further than K_TOLERANCE from the line of its segment,
+                 as it could not be recovered from its path parameter.
+        """
+        segment_lengths, t_values, E_values = [], [], []
+        for (initial_k, final_k), df in zip(k_pairs, frames):
+            k0 = np.asarray(initial_k, dtype=np.float64)
+            direction = np.asarray(final_k, dtype=np.float64) - k0
+            length_squared = direction @ direction
+            k = df[['kx', 'ky', 'kz']].to_numpy(dtype=np.float64)
+            # Project each k point onto the segment, a zero length segment has t = 0 everywhere
+            t = (k - k0) @ direction / length_squared if length_squared > 0 else np.zeros(len(df))
+            residual = np.abs(k - (k0 + t[:, None] * direction)).max() if len(df) else 0.0
+            if residual > K_TOLERANCE:
+                raise ValueError(f"k points of segment {tuple(initial_k)} to {tuple(final_k)} lie up to {residual:.3g} "
+                                 f"from the segment line, combine without --compact to keep them exactly")
+            segment_lengths.append(len(df))
+            t_values.append(t.astype(np.float32))
+            E_values.append(df['E'].to_numpy().astype(energy_dtype))
+        k0 = [pair[0] for pair in k_pairs[:len(segment_lengths)]]
+        kf = [pair[1] for pair in k_pairs[:len(segment_lengths)]]
+        return cls(k0, kf, segment_lengths,
+                   np.concatenate(t_values) if t_values else np.zeros(0, dtype=np.float32),
+                   np.concatenate(E_values) if E_values else np.zeros(0, dtype=energy_dtype))
+
+    @classmethod
+    def load(cls, file_path):
+        """Loads a compact band structure saved with save."""
+        with np.load(file_path) as data:
+            return cls(data['k0'], data['kf'], data['segment_lengths'], data['t'], data['E'])
+
+    def save(self, file_path):
+        """Saves the compact band structure to a compressed .npz file."""
+        np.savez_compressed(file_path, k0=self.k0, kf=self.kf, segment_lengths=self.segment_lengths, t=self.t, E=self.E)
+
+    def __len__(self):
+        return len(self.E)
+
+    def segment_index(self):
+        """Returns the index of the segment each row belongs to."""
+        return np.repeat(np.arange(len(self.segment_lengths), dtype=np.int32), self.segment_lengths)
+
+    def segment_starts(self):
+        """Returns the first row of each segment."""
+        return np.concatenate(([0], np.cumsum(self.segment_lengths)[:-1])).astype(np.int64)
+
+    def cartesian_k(self, dtype=np.float64, rows=None):
+        """
+        Expands the path parameters to Cartesian k values.
+
+        :param dtype: The dtype of the returned array.
+        :param rows: Indices of the rows to expand, defaults to every row.
+        :return: An (n_rows, 3) array of kx, ky, kz.
+        """
+        segment = self.segment_index()
+        t = self.t
+        if rows is not None:
+            segment, t = segment[rows], t[rows]
+        t = t.astype(dtype)[:, None]
+        return (self.k0[segment] + t * (self.kf[segment] - self.k0[segment])).astype(dtype)
+
+    def path_distance(self):
+        """
+        Returns the cumulative distance along the k-space path of each row, as summing the steps between
+        consecutive Cartesian k values would, without expanding them.
+        """
+        segment_norms = np.linalg.norm(self.kf - self.k0, axis=1)
+        # Distance covered before each segment, including any jump from the end of the previous segment
+        jumps = np.concatenate(([0.0], np.linalg.norm(self.k0[1:] - self.kf[:-1], axis=1)))
+        offsets = np.cumsum(jumps + np.concatenate(([0.0], segment_norms[:-1])))
+        segment = self.segment_index()
+        return offsets[segment] + self.t.astype(np.float64) * segment_norms[segment]
+
+    def segment_point_rows(self):
+        """
+        Returns the (row, label) pairs of the Segment_Point column of the combined CSV format: the start and
+        end point of each segment on its first and last row.
+        """
+        point_rows = []
+        for i, (start, length) in enumerate(zip(self.segment_starts(), self.segment_lengths)):
+            if length > 1:
+                point_rows.append((start, _point_label(self.k0[i])))
+            if length > 0:
+                # A single row segment is labelled with its end point, as in the combined CSV
+                point_rows.append((start + length - 1, _point_label(self.kf[i])))
+        return point_rows
+
+    def segment_points(self):
+        """Returns the Segment_Point column of the combined CSV format, NaN on rows that are not a segment point."""
+        segment_points = np.full(len(self), np.nan, dtype=object)
+        for row, label in self.segment_point_rows():
+            segment_points[row] = label
+        return segment_points
+
+    def nearest_segment_point(self, row):
+        """
+        Returns the label of the segment point nearest to a row, the start of its segment on a tie,
+        as found by searching the Segment_Point column of the combined CSV format.
+        """
+        segment = np.searchsorted(np.cumsum(self.segment_lengths), row, side='right')
+        offset = row - self.segment_starts()[segment]
+        length = self.segment_lengths[segment]
+        if length > 1 and offset <= length - 1 - offset:
+            return _point_label(self.k0[segment])
+        return _point_label(self.kf[segment])
+
+    def to_dataframe(self, cartesian=True, k_dtype=np.float64):
+        """
+        Converts the compact band structure to a DataFrame.
+
+        :param cartesian: If True, return the combined CSV columns kx, ky, kz, E and Segment_Point.
+                          Otherwise return only the compact columns segment, t and E.
+        :param k_dtype: The dtype of the expanded k values.
+        :return: A DataFrame of the band structure.
+        """
+        if not cartesian:
+            return pd.DataFrame({'segment': self.segment_index(), 't': self.t, 'E': self.E})
+        k = self.cartesian_k(k_dtype)
+        return pd.DataFrame({'kx': k[:, 0], 'ky': k[:, 1], 'kz': k[:, 2], 'E': self.E,
+                             'Segment_Point': self.segment_points()})
+
+
+def _as_number(value):
+    """Returns integral floats as ints so segment points print as they do in the combined CSV, e.g. (0, 2, 0)."""
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def _point_label(k):
+    """Returns the Segment_Point label of a k-vector."""
+    return str(tuple(_as_number(value) for value in k))
+
+
+def load_band_data(file_path, cartesian=True):
+    """
+    Loads band structure data from either a CSV file or a compact .npz file.
+
+    :param file_path: Path to a .csv or .npz band structure file.
+    :param cartesian: For compact files, whether to expand to Cartesian k values (see CompactBandStructure.to_dataframe).
+    :return: A DataFrame of the band structure.
+    """
+    if os.path.splitext(file_path)[1] == '.npz':
+        return CompactBandStructure.load(file_path).to_dataframe(cartesian=cartesian)
+    return pd.read_csv(file_path)
@@ -0,0 +1,345 @@
+import sqlite3
+import functools
+import time
+import os
+import sys
+from contextlib import contextmanager
+
+# Allow the repository packages to be imported when run as a script from the Catalog folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from KSpace.kspacesetup import segment_name
+
+
+def default_catalog_path():
+    """Returns the location of the catalog database: $MPBCALC_CATALOG, or results_catalog.db in the working directory."""
+    return os.environ.get('MPBCALC_CATALOG', os.path.join(os.getcwd(), 'results_catalog.db'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_dir TEXT NOT NULL UNIQUE,
+    title TEXT,
+    material TEXT,
+    template_path TEXT,
+    template_hash TEXT,
+    symbolic_path TEXT,
+    nk INTEGER,
+    args_file TEXT,
+    combined_csv TEXT,
+    band_energy REAL,
+    mean_energy REAL,
+    max_segment_point TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    segment_index INTEGER,
+    name TEXT NOT NULL,
+    k0 TEXT,
+    kf TEXT,
+    xml_file TEXT,
+    ascii_file TEXT,
+    csv_file TEXT,
+    n_rows INTEGER,
+    m_star_heavy_hole REAL,
+    m_star_light_hole REAL,
+    updated_at REAL,
+    UNIQUE (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS timings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    segment_name TEXT,
+    stage TEXT NOT NULL,
+    seconds REAL,
+    recorded_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_material ON runs(material);
+CREATE INDEX IF NOT EXISTS idx_runs_template_hash ON runs(template_hash);
+CREATE INDEX IF NOT EXISTS idx_runs_symbolic_path ON runs(symbolic_path);
+CREATE INDEX IF NOT EXISTS idx_runs_nk ON runs(nk);
+CREATE INDEX IF NOT EXISTS idx_runs_band_energy ON runs(band_energy);
+CREATE INDEX IF NOT EXISTS idx_segments_run ON segments(run_id);
+CREATE INDEX IF NOT EXISTS idx_segments_k ON segments(k0, kf);
+CREATE INDEX IF NOT EXISTS idx_timings_run_stage ON timings(run_id, stage);
+"""
+
+
+def file_hash(file_path):
+    """
+    Computes the SHA-256 hash of a file, used to identify runs generated from the same XML template.
+
+    :param file_path: Path to the file to hash.
+    :return: The hex digest of the file contents.
+    """
+    import hashlib
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+# Extensions of the files written for each segment, segment names themselves contain dots (e.g. 0.5_2_0.5)
+SEGMENT_FILE_SUFFIXES = ('.nd_Ek_ascii', '.nd_Ek', '.csv', '.xml')
+
+
+def segment_name_from_file(file_path):
+    """
+    Returns the segment name of an output file, i.e. its base name without the segment file extension,
+    e.g. 'silicon_0.5_2_0.5to1.5_1.5_0' for 'out/silicon_0.5_2_0.5to1.5_1.5_0.nd_Ek_ascii'.
+    """
+    name = os.path.basename(file_path)
+    for suffix in SEGMENT_FILE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def log_catalog_errors(method):
+    """Decorates a recording method so database errors are printed as a warning rather than failing the stage."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except (sqlite3.Error, OSError) as error:
+            print(f"Warning: failed to update the results catalog {self.db_path}: {error}")
+    return wrapper
+
+
+class ResultsCatalog:
+    """
+    A local SQLite catalog holding one row per run (output directory) and one row per path segment.
+    Pipeline stages are given a catalog to record their outputs in, so runs can be queried without walking
+    the filesystem. Recording never fails a stage, errors are printed as warnings instead.
+    """
+    def __init__(self, db_path=None):
+        """
+        :param db_path: Path to the SQLite database file, created if it does not exist.
+                        Defaults to default_catalog_path().
+        """
+        self.db_path = db_path or default_catalog_path()
+        self.connection = sqlite3.connect(self.db_path, timeout=10)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run_id(self, run_dir, create=True):
+        """Returns the id of the run stored in run_dir, inserting an empty run row if required."""
+        run_dir = os.path.abspath(run_dir)
+        row = self.connection.execute('SELECT id FROM runs WHERE run_dir = ?', (run_dir,)).fetchone()
+        if row is not None:
+            return row['id']
+        if not create:
+            return None
+        now = time.time()
+        cursor = self.connection.execute(
+            'INSERT INTO runs (run_dir, created_at, updated_at) VALUES (?, ?, ?)', (run_dir, now, now))
+        return cursor.lastrowid
+
+    def _update_segment(self, run_dir, name, **fields):
+        """Updates the given columns of a segment, inserting the segment if it is not yet catalogued."""
+        with self.connection:
+            run_id = self._run_id(run_dir)
+            self.connection.execute(
+                'INSERT OR IGNORE INTO segments (run_id, name) VALUES (?, ?)', (run_id, name))
+            fields['updated_at'] = time.time()
+            assignments = ', '.join(f'{column} = ?' for column in fields)
+            self.connection.execute(
+                f'UPDATE segments SET {assignments} WHERE run_id = ? AND name = ?',
+                (*fields.values(), run_id, name))
+
+    @log_catalog_errors
+    def register_run(self, run_dir, template_path, title, material, symbolic_path, nk, k_pairs):
+        """
+        Records a newly generated run along with the XML file of each of its segments.
+        Generating into the directory of an earlier run replaces it: its results, segments and timings are removed.
+
+        :param run_dir: Output directory holding the XML files and args.json of the run.
+        :param template_path: Path to the XML template the run was generated from.
+        :param title: Title written to args.json.
+        :param material: Full material name of the template, e.g. 'InSb'.
+        :param symbolic_path: A list of symbols representing the path in k-space.
+        :param nk: Number of k points per segment.
+        :param k_pairs: A list of (initial_k, final_k) tuples, one for each segment.
+        """
+        base_file_name = os.path.splitext(os.path.basename(template_path))[0]
+        now = time.time()
+        with self.connection:
+            run_id = self._run_id(run_dir)
+            self.connection.execute('DELETE FROM segments WHERE run_id = ?', (run_id,))
+            self.connection.execute('DELETE FROM timings WHERE run_id = ?', (run_id,))
+            self.connection.execute(
+                """UPDATE runs SET title = ?, material = ?, template_path = ?, template_hash = ?,
+                   symbolic_path = ?, nk = ?, args_file = ?, combined_csv = NULL, band_energy = NULL,
+                   mean_energy = NULL, max_segment_point = NULL, created_at = ?, updated_at = ? WHERE id = ?""",
+                (title, material, os.path.abspath(template_path), file_hash(template_path),
+                 ','.join(symbolic_path), nk, os.path.join(os.path.abspath(run_dir), 'args.json'),
+                 now, now, run_id))
+        for i, (initial_k, final_k) in enumerate(k_pairs):
+            name = segment_name(base_file_name, initial_k, final_k)
+            self._update_segment(run_dir, name, segment_index=i, k0=str(tuple(initial_k)), kf=str(tuple(final_k)),
+                                 xml_file=os.path.join(os.path.abspath(run_dir), f"{name}.xml"))
+
+    @log_catalog_errors
+    def record_segment_csv(self, ascii_file, csv_file, n_rows):
+        """Records the ASCII and CSV files produced for a segment by the converter."""
+        run_dir = os.path.dirname(os.path.abspath(csv_file))
+        self._update_segment(run_dir, segment_name_from_file(csv_file), ascii_file=os.path.abspath(ascii_file),
+                             csv_file=os.path.abspath(csv_file), n_rows=n_rows)
+
+    @log_catalog_errors
+    def record_effective_mass(self, csv_file, band_type, m_star):
+        """
+        Records the fitted effective mass parameter of a segment.
+
+        :param csv_file: The segment CSV file the fit was performed on.
+        :param band_type: Either 'heavy hole' or 'light hole'.
+        :param m_star: The fitted (hbar^2/2m*) parameter.
+        """
+        column = f"m_star_{band_type.replace(' ', '_')}"
+        if column not in ('m_star_heavy_hole', 'm_star_light_hole'):
+            raise ValueError(f"Unknown band type '{band_type}'")
+        run_dir = os.path.dirname(os.path.abspath(csv_file))
+        self._update_segment(run_dir, segment_name_from_file(csv_file), **{column: float(m_star)})
+
+    @log_catalog_errors
+    def record_combined_csv(self, run_dir, combined_csv):
+        """Records the combined CSV file of a run."""
+        with self.connection:
+            run_id = self._run_id(run_dir)
+            self.connection.execute('UPDATE runs SET combined_csv = ?, updated_at = ? WHERE id = ?',
+                                    (os.path.abspath(combined_csv), time.time(), run_id))
+
+    @log_catalog_errors
+    def record_band_analysis(self, run_dir, band_energy, mean_energy, max_segment_point):
+        """Records the bandgap, mean energy and maximum valence segment point of a run."""
+        with self.connection:
+            run_id = self._run_id(run_dir)
+            self.connection.execute(
+                'UPDATE runs SET band_energy = ?, mean_energy = ?, max_segment_point = ?, updated_at = ? WHERE id = ?',
+                (float(band_energy), float(mean_energy), str(max_segment_point), time.time(), run_id))
+
+    @log_catalog_errors
+    def record_timing(self, run_dir, stage, seconds, segment_name=None):
+        """
+        Records the time taken by a pipeline stage.
+
+        :param run_dir: Output directory of the run.
+        :param stage: Name of the stage, e.g. 'generate', 'jobs', 'convert', 'combine', 'analyze', 'effmass'.
+        :param seconds: Wall time of the stage in seconds.
+        :param segment_name: Segment the timing refers to, if the stage runs per segment.
+        """
+        with self.connection:
+            run_id = self._run_id(run_dir)
+            self.connection.execute(
+                'INSERT INTO timings (run_id, segment_name, stage, seconds, recorded_at) VALUES (?, ?, ?, ?, ?)',
+                (run_id, segment_name, stage, seconds, time.time()))
+
+    def query_runs(self, material=None, title=None, template_hash=None, symbolic_path=None, nk=None,
+                   min_gap=None, max_gap=None):
+        """
+        Returns the runs matching all of the given criteria, each as a sqlite3.Row.
+        A template_hash may be given as a prefix of the full hash.
+        """
+        conditions, values = [], []
+        for column, value in (('material', material), ('title', title), ('symbolic_path', symbolic_path), ('nk', nk)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                values.append(value)
+        if template_hash is not None:
+            conditions.append('template_hash LIKE ?')
+            values.append(f'{template_hash}%')
+        if min_gap is not None:
+            conditions.append('band_energy >= ?')
+            values.append(min_gap)
+        if max_gap is not None:
+            conditions.append('band_energy <= ?')
+            values.append(max_gap)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self.connection.execute(f'SELECT * FROM runs{where} ORDER BY created_at', values).fetchall()
+
+    def query_segments(self, run_id):
+        """Returns the segments of a run ordered along the path."""
+        return self.connection.execute(
+            'SELECT * FROM segments WHERE run_id = ? ORDER BY segment_index, name', (run_id,)).fetchall()
+
+    def query_timings(self, run_id):
+        """Returns the total time recorded for each stage of a run."""
+        return self.connection.execute(
+            'SELECT stage, SUM(seconds) AS seconds, COUNT(*) AS count FROM timings WHERE run_id = ? GROUP BY stage',
+            (run_id,)).fetchall()
+
+
+def open_catalog(db_path=None):
+    """
+    Opens the results catalog, returning None (after printing a warning) if it cannot be opened,
+    e.g. on a read-only filesystem.
+
+    :param db_path: Path to the SQLite database file, defaults to default_catalog_path().
+    """
+    try:
+        return ResultsCatalog(db_path)
+    except (sqlite3.Error, OSError) as error:
+        print(f"Warning: results catalog {db_path or default_catalog_path()} could not be opened: {error}")
+        return None
+
+
+@contextmanager
+def catalog_from_args(args):
+    """
+    Yields the catalog selected by the --catalog and --no_catalog arguments (see User.parser.add_catalog_option),
+    or None if cataloguing is disabled or the catalog cannot be opened.
+    """
+    catalog = None if args.no_catalog else open_catalog(args.catalog)
+    try:
+        yield catalog
+    finally:
+        if catalog is not None:
+            catalog.close()
+
+
+def print_rows(rows, columns):
+    """Prints rows as a whitespace aligned table with the given columns."""
+    table = [columns] + [['' if row[column] is None else str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print('  '.join(value.ljust(width) for value, width in zip(line, widths)))
+
+
+def query_catalog(args):
+    """Prints the runs matching the parsed catalog arguments (see User.parser.add_catalog_arguments)."""
+    symbolic_path = args.path.replace('G', 'Γ') if args.path else None
+    with ResultsCatalog(args.db) as catalog:
+        runs = catalog.query_runs(material=args.material, title=args.title, template_hash=args.template_hash,
+                                  symbolic_path=symbolic_path, nk=args.nk, min_gap=args.min_gap, max_gap=args.max_gap)
+        print_rows(runs, ['id', 'material', 'symbolic_path', 'nk', 'band_energy', 'mean_energy',
+                          'max_segment_point', 'run_dir'])
+        for run in runs:
+            if args.segments:
+                print(f"\nSegments of run {run['id']} ({run['run_dir']}):")
+                print_rows(catalog.query_segments(run['id']), ['segment_index', 'k0', 'kf', 'n_rows',
+                                                               'm_star_heavy_hole', 'm_star_light_hole', 'csv_file'])
+            if args.timings:
+                print(f"\nTimings of run {run['id']} ({run['run_dir']}):")
+                print_rows(catalog.query_timings(run['id']), ['stage', 'seconds', 'count'])
+
+
+if __name__ == '__main__':
+    import argparse
+    from User.parser import add_catalog_arguments
+
+    parser = argparse.ArgumentParser(description='Query the results catalog of band structure runs.')
+    add_catalog_arguments(parser)
+    query_catalog(parser.parse_args())
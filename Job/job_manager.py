@@ -1,17 +1,28 @@
 # job_manager.py
 import os
+import json
 import subprocess
 import time
+from Catalog.catalog import open_catalog
+
+STATE_FILE_NAME = 'job_state.json'  # Written to the job directory on submission so jobs can be tracked later
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 class JobManager:
-    def __init__(self, xml_directory, job_directory, executable, post_process_script, combiner_script, combiner_directory):
-        self.xml_directory = xml_directory
-        self.job_directory = job_directory
+    def __init__(self, xml_directory, job_directory, executable, post_process_script, combiner_directory,
+                 converter_script=os.path.join(REPO_DIRECTORY, 'csv_ascii_converter.py'), batch_convert=False,
+                 catalog_path=None):
+        # Paths are stored absolute, as the jobs may be tracked later from another directory
+        self.xml_directory = os.path.abspath(xml_directory)
+        self.job_directory = os.path.abspath(job_directory)
         self.executable = executable
         self.post_process_script = post_process_script
-        self.combiner_script = combiner_script
-        self.combiner_directory = combiner_directory
+        self.combiner_directory = os.path.abspath(combiner_directory)
+        self.converter_script = os.path.abspath(converter_script)
+        self.batch_convert = batch_convert  # Convert all segments in one pass after the jobs rather than inside each job
+        self.catalog_path = catalog_path  # Results catalog recorded in after the jobs, None to skip recording
         self.job_ids = []
+        self.submit_time = None
 
     def create_job_script(self, xml_file):
         """Creates and writes a job script for the given XML file."""
@@ -22,6 +33,10 @@ class JobManager:
         job_script_path = os.path.join(self.job_directory, f"{job_name}.sh")
         nd_ek_ascii_file = xml_file.replace('.xml', '.nd_Ek')  # Expected output from fmtdat
         csv_file = nd_ek_ascii_file.replace('.nd_Ek', '.nd_Ek_ascii')
+        convert_command = "" if self.batch_convert else f"""
+# Convert ASCII to CSV, the catalog is updated once the jobs complete rather than by concurrent jobs
+python3 {self.converter_script} --no_catalog "{csv_file}"
+"""
 
         with open(job_script_path, 'w') as job_script:
             job_script.write(f"""#!/bin/bash
@@ -54,14 +69,12 @@ mpirun -np $PBS_NCPUS "{self.executable}" "{xml_file}"
 
 # Post-processing
 {self.post_process_script} -a2 "{nd_ek_ascii_file}"
-
-# Convert ASCII to CSV
-python3 csv_ascii_converter.py "{csv_file}"
-""")
+{convert_command}""")
         return job_script_path
 
     def submit_jobs(self):
         """Submits a job for each XML file in the specified directory and collects job IDs."""
+        self.submit_time = time.time()
         for xml_file in os.listdir(self.xml_directory):
             if xml_file.endswith('.xml'):
                 full_xml_path = os.path.join(self.xml_directory, xml_file)
@@ -71,6 +84,42 @@ python3 csv_ascii_converter.py "{csv_file}"
                 result = subprocess.run(['qsub', job_script_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
                 job_id = result.stdout.decode().strip()
                 self.job_ids.append(job_id)
+        self.save_state()
+
+    def save_state(self):
+        """Saves the submitted job IDs and the manager settings to the job directory."""
+        os.makedirs(self.job_directory, exist_ok=True)
+        state = {
+            'xml_directory': self.xml_directory,
+            'job_directory': self.job_directory,
+            'executable': self.executable,
+            'post_process_script': self.post_process_script,
+            'combiner_directory': self.combiner_directory,
+            'converter_script': self.converter_script,
+            'batch_convert': self.batch_convert,
+            'catalog_path': self.catalog_path,
+            'job_ids': self.job_ids,
+            'submit_time': self.submit_time,
+        }
+        with open(os.path.join(self.job_directory, STATE_FILE_NAME), 'w') as state_file:
+            json.dump(state, state_file, indent=4)
+
+    @classmethod
+    def from_state(cls, job_directory):
+        """
+        Restores a JobManager from the state saved in a job directory by submit_jobs.
+
+        :param job_directory: Directory containing the job scripts and job_state.json.
+        :return: A JobManager holding the submitted job IDs.
+        """
+        with open(os.path.join(job_directory, STATE_FILE_NAME), 'r') as state_file:
+            state = json.load(state_file)
+        job_ids = state.pop('job_ids')
+        submit_time = state.pop('submit_time')
+        job_manager = cls(**state)
+        job_manager.job_ids = job_ids
+        job_manager.submit_time = submit_time
+        return job_manager
 
     def check_job_status(self, job_id):
         """Checks the status of a job given its job ID."""
@@ -84,6 +133,15 @@ python3 csv_ascii_converter.py "{csv_file}"
             # If 'qstat' fails, assume the job is no longer listed and thus completed
             return 'completed'
 
+    def report_status(self):
+        """Prints the status of each submitted job once and returns True if all have completed."""
+        statuses = {job_id: self.check_job_status(job_id) for job_id in self.job_ids}
+        for job_id, status in statuses.items():
+            print(f"{job_id}: {status}")
+        completed = sum(status == 'completed' for status in statuses.values())
+        print(f"{completed}/{len(statuses)} jobs completed.")
+        return completed == len(statuses)
+
     def track_jobs(self):
         """Tracks the submitted jobs until all have completed."""
         all_completed = False
@@ -99,12 +157,26 @@ python3 csv_ascii_converter.py "{csv_file}"
                 time.sleep(60)  # Check again in 60 seconds
 
     def track_and_combine_jobs(self):
-        """Tracks the submitted jobs and combines them after completion."""
+        """Tracks the submitted jobs, then converts (if batch_convert is set) and combines their outputs."""
         if self.job_ids:
             print("Tracking job status...")
             self.track_jobs()  # Track jobs until completion
-            print("All jobs completed. Running the combiner script.")
-            os.system(f'python {self.combiner_script} -dir {self.combiner_directory}')
+
+            # Imported here so that only checking on the jobs never imports pandas
+            from csv_ascii_converter import process_directory
+            from csv_combiner import run_combination_process
+            catalog = open_catalog(self.catalog_path) if self.catalog_path else None
+            try:
+                if catalog is not None:
+                    catalog.record_timing(self.xml_directory, 'jobs', time.time() - self.submit_time)
+                if self.batch_convert:
+                    print("All jobs completed. Converting ASCII files to CSV.")
+                    process_directory(self.xml_directory, catalog=catalog)
+                print("All jobs completed. Combining the CSV files.")
+                run_combination_process(self.combiner_directory, catalog=catalog)
+            finally:
+                if catalog is not None:
+                    catalog.close()
         else:
             print("No jobs were submitted, so no tracking or combining is necessary.")
 
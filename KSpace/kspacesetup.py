@@ -43,6 +43,17 @@ class KSpaceSetup:
         # Generate pairs of initial and final k-vectors
         return [(k_values_path[i], k_values_path[i + 1]) for i in range(len(k_values_path) - 1)]
 
+def segment_name(base_file_name, initial_k, final_k):
+    """
+    Returns the name shared by the XML file and the outputs of a path segment, e.g. 'silicon_0_0_0to1_1_1'.
+
+    :param base_file_name: Name of the XML template without its extension.
+    :param initial_k: The initial k-vector of the segment.
+    :param final_k: The final k-vector of the segment.
+    """
+    path_str = "to".join(["_".join(map(str, initial_k)), "_".join(map(str, final_k))])
+    return f"{base_file_name}_{path_str}"
+
 def pull_name(xml_file_path):
     """
     Extracts the type of base material from the 'ShapeName_1' group in an XML file.
@@ -71,6 +82,45 @@ def pull_name(xml_file_path):
             raise ValueError("Failed to find 'mat' object")
 
 
+def pull_material(xml_file_path):
+    """
+    Extracts the full base material name from the first shape group of an XML file that sets a material,
+    e.g. 'InSb' for a value of '{ In Sb }'. Shape groups are found by their 'Shape' cTag rather than their
+    name, which differs between templates (e.g. 'ShapeName_1', 'IndiumArsenideShape').
+
+    :param xml_file_path: Path to the XML file to parse.
+    :return: The extracted material name as a string, or None if no shape group sets a material.
+    """
+    tree = ET.parse(xml_file_path)
+    root = tree.getroot()
+
+    for shape in root.findall(".//group[@type='obj'][cTag='Shape']"):
+        for param in shape.findall(".//param"):
+            cTag = param.find('cTag')
+            if cTag is not None and cTag.text == 'mat':
+                value = param.find('value')
+                if value is not None and value.text:
+                    return ''.join(value.text.strip('{} ').split())
+    return None
+
+
+def pull_nk(xml_file_path):
+    """
+    Extracts the number of k space points per segment ('Nk') from an XML file.
+
+    :param xml_file_path: Path to the XML file to parse.
+    :return: The number of k points as an integer, or None if 'Nk' is not set.
+    """
+    tree = ET.parse(xml_file_path)
+    root = tree.getroot()
+
+    for param in root.findall(".//param"):
+        cTag = param.find('cTag')
+        if cTag is not None and cTag.text == 'Nk':
+            return int(param.find('value').text.strip())
+    return None
+
+
 def update_k_vectors(xml_file_path, paths, output_folder, symbolic_path):
     """
     Update the initial and final k-vectors in an XML file based on provided paths and save the updated XML
@@ -114,8 +164,7 @@ def update_k_vectors(xml_file_path, paths, output_folder, symbolic_path):
                 param.find("./value").text = f"{{ {' '.join(map(str, final_k))} }}"
 
         # Construct the output filename
-        path_str = "to".join(["_".join(map(str, initial_k)), "_".join(map(str, final_k))])
-        output_file_name = f"{base_file_name}_{path_str}.xml"
+        output_file_name = f"{segment_name(base_file_name, initial_k, final_k)}.xml"
         output_file_path = os.path.join(output_folder, output_file_name)
 
         # Save the modified XML to the new file
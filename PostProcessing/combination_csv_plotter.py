@@ -1,22 +1,46 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans
 import argparse
 import os
+import sys
 import json
+import time
+
+# Allow the repository packages to be imported when run as a script from the PostProcessing folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Catalog.catalog import catalog_from_args
+from BandData.compact import CompactBandStructure
+from PostProcessing.plot_renderer import render_all
+from User.parser import add_analyze_arguments, add_catalog_option
 
 class BandStructureAnalyzer:
-    def __init__(self, args):
+    def __init__(self, args, catalog=None):
+        """
+        :param args: Parsed arguments, see User.parser.add_analyze_arguments.
+        :param catalog: ResultsCatalog the band analysis is recorded in, or None to skip recording.
+        """
         self.args = args
-        self.df = pd.read_csv(os.path.join(os.getcwd(), args.csv_local_dir))
+        self.catalog = catalog
+        file_path = os.path.join(os.getcwd(), args.csv_local_dir)
+        # Compact files are analysed on their segment, t and E columns, Cartesian k is only built where needed
+        self.compact = CompactBandStructure.load(file_path) if file_path.endswith('.npz') else None
+        self.df = self.compact.to_dataframe(cartesian=False) if self.compact is not None else pd.read_csv(file_path)
         self.subspace_df = self.df[(self.df['E'] >= args.sep_limits[0]) & (self.df['E'] <= args.sep_limits[1])]
         self.mean_energy = None
         self.bandgap_energy = None
         self.segment_of_max_valence = None
+        self.highest_valence_point = None
+        self.lowest_conduction_point = None
 
     def apply_kmeans_clustering(self):
         kmeans = KMeans(n_clusters=2)
-        subspace_clusters = kmeans.fit_predict(self.subspace_df[['kx', 'E']].values)
+        if self.compact is not None:
+            kx = self.compact.cartesian_k(rows=self.subspace_df.index.to_numpy())[:, 0]
+            features = np.column_stack((kx, self.subspace_df['E'].to_numpy(dtype=np.float64)))
+        else:
+            features = self.subspace_df[['kx', 'E']].values
+        subspace_clusters = kmeans.fit_predict(features)
         self.subspace_df['cluster'] = subspace_clusters
         centroids = kmeans.cluster_centers_
         self.mean_energy = centroids[:, 1].mean()
@@ -27,9 +51,13 @@ class BandStructureAnalyzer:
         highest_valence_point = valence_band.loc[valence_band['E'].idxmax()]
         lowest_conduction_point = conduction_band.loc[conduction_band['E'].idxmin()]
         self.bandgap_energy = lowest_conduction_point['E'] - highest_valence_point['E']
+        self.highest_valence_point = highest_valence_point
+        self.lowest_conduction_point = lowest_conduction_point
         self.segment_of_max_valence = self.find_nearest_segment(highest_valence_point.name)
 
     def find_nearest_segment(self, index):
+        if self.compact is not None:
+            return self.compact.nearest_segment_point(index)
         max_range = max(len(self.df), index)
         nearest_segment = None
         nearest_distance = max_range
@@ -48,11 +76,50 @@ class BandStructureAnalyzer:
         
         return nearest_segment
 
+    def path_distance(self):
+        """Returns the cumulative distance along the k-space path of each row of the combined data."""
+        if self.compact is not None:
+            return self.compact.path_distance()
+        k = self.df[['kx', 'ky', 'kz']].to_numpy(dtype=np.float64)
+        steps = np.linalg.norm(np.diff(k, axis=0), axis=1)
+        return np.concatenate(([0.0], np.cumsum(steps)))
+
     def plot_and_save(self):
-        plt.figure(figsize=(10, 8))
-        # Add plotting code here, similar to what you already have
-        # Remember to use self.mean_energy, self.bandgap_energy, etc.
-        plt.close()
+        distance = self.path_distance()
+        valence = (self.df['E'] < self.mean_energy).to_numpy()
+        conduction = (self.df['E'] > self.mean_energy).to_numpy()
+        energies = self.df['E'].to_numpy()
+        edges = [self.highest_valence_point.name, self.lowest_conduction_point.name]
+
+        # Segment points mark the start and end of each segment, consecutive duplicates share a position
+        if self.compact is not None:
+            segment_point_rows = self.compact.segment_point_rows()
+        else:
+            segment_point_rows = [(row, self.df.at[row, 'Segment_Point']) for row in self.df.index[self.df['Segment_Point'].notna()]]
+        segment_lines, segment_labels = [], []
+        for row, label in segment_point_rows:
+            if not segment_lines or not np.isclose(distance[row], segment_lines[-1]):
+                segment_lines.append(distance[row])
+                segment_labels.append(str(label))
+
+        os.makedirs(self.args.save_dir, exist_ok=True)
+        save_path = os.path.join(self.args.save_dir, 'bandstructure_plot.png')
+        render_all([{
+            'kind': 'bands',
+            'filename': save_path,
+            'title': self.args.plot_title,
+            'xlabel': 'Distance along path (2$\\pi$/a)',
+            'layers': [
+                {'x': distance[valence], 'y': energies[valence], 'c': 'blue', 'label': 'Valence Band', 's': 10},
+                {'x': distance[conduction], 'y': energies[conduction], 'c': 'red', 'label': 'Conduction Band', 's': 10},
+                {'x': distance[edges], 'y': energies[edges], 'c': 'green', 's': 60, 'marker': '*',
+                 'label': f'Bandgap ({float(self.bandgap_energy):.3f} eV)'},
+            ],
+            'mean_energy': self.mean_energy,
+            'segment_lines': segment_lines,
+            'segment_labels': segment_labels,
+            'ylim': self.args.plot_limits or self.args.sep_limits,
+        }], workers=1)
 
     def update_args_file(self):
         args_file_path = os.path.join(os.path.dirname(self.args.csv_local_dir), 'args.json')
@@ -60,28 +127,36 @@ class BandStructureAnalyzer:
             args_data = json.load(file)
         
         args_data['max_segment_point'] = str(self.segment_of_max_valence)
-        args_data['band_energy'] = self.bandgap_energy
-        args_data['mean_energy'] = self.mean_energy
+        args_data['band_energy'] = float(self.bandgap_energy)  # Compact files may hold float32 energies
+        args_data['mean_energy'] = float(self.mean_energy)
         
         with open(args_file_path, 'w') as file:
             json.dump(args_data, file, indent=4)
         print("Updated args data:", args_data)
 
+    def update_catalog(self, seconds):
+        if self.catalog is None:
+            return
+        run_dir = os.path.dirname(os.path.abspath(self.args.csv_local_dir))
+        self.catalog.record_band_analysis(run_dir, self.bandgap_energy, self.mean_energy, self.segment_of_max_valence)
+        self.catalog.record_timing(run_dir, 'analyze', seconds)
+
     def run(self):
+        start_time = time.time()
         self.apply_kmeans_clustering()
         self.identify_band_edges()
-        self.plot_and_save()
+        # Save the results before plotting, so a failed plot never loses them
         self.update_args_file()
+        self.update_catalog(time.time() - start_time)
+        self.plot_and_save()
 
 if __name__ == "__main__":
     # Set up argument parsing
     parser = argparse.ArgumentParser(description='Bandstructure Viewer with Clustering and Plotting Options.')
-    parser.add_argument('--csv_local_dir', type=str, required=True, help='Local relative directory of the CSV file.')
-    parser.add_argument('--sep_limits', type=float, nargs=2, default=[-3, 3], help='Energy range limits for separation calculation (valence and conduction bands).')
-    parser.add_argument('--plot_limits', type=float, nargs=2, help='Energy range limits for plotting. If not provided, sep_limits will be used.')
-    parser.add_argument('--save_dir', type=str, required=True, help='Directory where the plot should be saved.')
-    parser.add_argument('--plot_title', type=str, required=True, help='Title of Plot')
+    add_analyze_arguments(parser)
+    add_catalog_option(parser)
     args = parser.parse_args()
 
-    analyzer = BandStructureAnalyzer(args)
-    analyzer.run()
+    with catalog_from_args(args) as catalog:
+        analyzer = BandStructureAnalyzer(args, catalog)
+        analyzer.run()
@@ -1,15 +1,26 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans
 from scipy.optimize import curve_fit
 import os
+import sys
+import time
 import json  # For saving effective mass arguments
 import argparse
 
+# Allow the repository packages to be imported when run as a script from the PostProcessing folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Catalog.catalog import catalog_from_args, segment_name_from_file
+from PostProcessing.plot_renderer import render_all
+from User.parser import add_effmass_arguments, add_catalog_option
+
 class EffectiveMassCalculator:
-    def __init__(self, filepath, percentage_windows, mean_energy, sep_limits,max_valence_k):
+    def __init__(self, filepath, percentage_windows, mean_energy, sep_limits,max_valence_k, catalog=None):
+        """
+        :param catalog: ResultsCatalog the fitted effective masses are recorded in, or None to skip recording.
+        """
         self.filepath = filepath
+        self.catalog = catalog
         self.percentage_windows = percentage_windows
         self.filename = os.path.basename(filepath).split('.')[0]
         self.directory = f'effective_mass_{self.filename}'
@@ -21,9 +32,8 @@ class EffectiveMassCalculator:
             os.makedirs(self.directory)
         if not os.path.exists(self.args_directory):
             os.makedirs(self.args_directory)
-        # Enable LaTeX in plots
-        plt.rc('text', usetex=True)
-        plt.rc('font', family='serif')
+        # Figures are collected as specs and rendered afterwards, see plot_renderer.render_all
+        self.plot_specs = []
 
     @staticmethod
     def parabolic_energy(k, E0, m_star_inverse):
@@ -39,17 +49,15 @@ class EffectiveMassCalculator:
             return [E0_initial, 0], False, [0, 0]  # Return initial values and False indicating failure to fit along with zero errors
 
     def plot_convergence(self, errors, percentage_windows, band_type):
-        """Plots the fitting error as a function of the window percentage."""
-        plt.figure(figsize=(10, 8))
-        plt.plot(percentage_windows, errors, 'bo-', label=f'{band_type.capitalize()} Band Convergence')
-        plt.xlabel('Window Size (Percent)')
-        plt.ylabel('Fitting Error', fontsize=14)  # Correct LaTeX formatting
-        plt.title(f'Convergence Plot for {band_type.capitalize()} Band')
-        plt.legend()
-        plt.grid(True)
-        plt.savefig(f'{self.directory}/convergence_{band_type}.png')
-        plt.close()
-        print(f"Convergence plot saved to {self.directory}/convergence_{band_type}.png")
+        """Queues a plot of the fitting error as a function of the window percentage."""
+        self.plot_specs.append({
+            'kind': 'convergence',
+            'filename': f'{self.directory}/convergence_{band_type.replace(" ", "_")}.png',
+            'title': f'Convergence Plot for {band_type.capitalize()} Band',
+            'label': f'{band_type.capitalize()} Band Convergence',
+            'percentage_windows': list(percentage_windows),
+            'errors': list(errors),
+        })
 
     def best_fit_convergence_plot(self, df, band_type='heavy hole', energy_offset=0):
         """Finds the best fit for different percentage windows and plots the fitting for the best window."""
@@ -110,54 +118,62 @@ class EffectiveMassCalculator:
             effective_mass_output = {'g': m_star, 'equivalency': '(h^2/a^2)(1/8m_{eff}e)'}
             with open(f'{self.args_directory}/m_star_{band_type.capitalize().replace(" ", "_")}.json', 'w') as f:
                 json.dump(effective_mass_output, f)
+            if self.catalog is not None:
+                self.catalog.record_effective_mass(self.filepath, band_type, m_star)
             print(f"Effective mass m* = {m_star:.2e} hbar^2/eV*m^2 (for best fit in {band_type.capitalize()} band)")
             
-            plt.figure(figsize=(10, 8))
             k_vals = np.linspace(best_grouped['k'].min(), best_grouped['k'].max(), 100)
-            plt.scatter(best_grouped['k'], best_grouped['E'], c='blue', label=f'Band Points (Best Window: {best_window}%)')
-            plt.plot(k_vals, self.parabolic_energy(k_vals, *best_params), 'r-', label=f'Fitted Parabola (Error: {best_error:.2e})')
-            plt.xlabel('$k$ (sqrt($k_x^2 + k_y^2 + k_z^2$))', fontsize=14)
-            plt.ylabel('Energy (E) [eV]', fontsize=14)
-            plt.title(f'Optimal Parabola Fitting for {band_type.capitalize()} Band', fontsize=16)
-            plt.legend()
-            plt.grid(True)
-            plot_filename = f'{self.directory}/{band_type.capitalize().replace(" ", "_")}_band_{best_window}%_fit.png'
-            plt.savefig(plot_filename)
-            #plt.show()
-            plt.close()
-            print(f"Plot saved to {plot_filename}")
+            self.plot_specs.append({
+                'kind': 'fit',
+                'filename': f'{self.directory}/{band_type.capitalize().replace(" ", "_")}_band_{best_window}%_fit.png',
+                'title': f'Optimal Parabola Fitting for {band_type.capitalize()} Band',
+                'k': best_grouped['k'].to_numpy(),
+                'E': best_grouped['E'].to_numpy(),
+                'k_fit': k_vals,
+                'E_fit': self.parabolic_energy(k_vals, *best_params),
+                'points_label': f'Band Points (Best Window: {best_window}%)',
+                'fit_label': f'Fitted Parabola (Error: {best_error:.2e})',
+            })
         else:
             print("No successful fit found.")
 
         # Plot the convergence
-        #self.plot_convergence(errors, self.percentage_windows, band_type)
+        self.plot_convergence(errors, self.percentage_windows, band_type)
 
    
     def plot_bands(self, df,offset=0):
-        """Plots the total energy bands: valence and conduction."""
-        plt.figure(figsize=(10, 8))
-
-        
+        """Queues a plot of the total energy bands: valence and conduction."""
         valence_band = df[df['E'] < self.mean_energy]
         conduction_band = df[df['E'] > self.mean_energy]
 
-        plt.scatter(valence_band['k'], valence_band['E'], c='blue', label='Valence Band', s=10)
-        plt.scatter(conduction_band['k'], conduction_band['E'], c='red', label='Conduction Band', s=10)
+        layers = [
+            {'x': valence_band['k'].to_numpy(), 'y': valence_band['E'].to_numpy(), 'c': 'blue', 'label': 'Valence Band', 's': 10},
+            {'x': conduction_band['k'].to_numpy(), 'y': conduction_band['E'].to_numpy(), 'c': 'red', 'label': 'Conduction Band', 's': 10},
+        ]
         if hasattr(self, 'best_heavy_hole_grouped'):
-            plt.scatter(self.best_heavy_hole_grouped['k'], self.best_heavy_hole_grouped['E'], c='green', label='Heavy Hole Group', s=10, marker='^')
+            layers.append({'x': self.best_heavy_hole_grouped['k'].to_numpy(), 'y': self.best_heavy_hole_grouped['E'].to_numpy(),
+                           'c': 'green', 'label': 'Heavy Hole Group', 's': 10, 'marker': '^'})
         if hasattr(self, 'best_light_hole_grouped'):
-            plt.scatter(self.best_light_hole_grouped['k'], self.best_light_hole_grouped['E'], c='purple', label='Light Hole Group', s=10, marker='s')
-
-        plt.axhline(y=self.mean_energy, color='grey', linestyle='--', label='Mean Energy')
-        plt.xlabel('k (pi/a)', fontsize=14)
-        plt.ylabel('Energy (E) [eV]', fontsize=14)
-        plt.title('Band Structure', fontsize=16)
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout()
-        plt.show()
-        
-    def run(self):
+            layers.append({'x': self.best_light_hole_grouped['k'].to_numpy(), 'y': self.best_light_hole_grouped['E'].to_numpy(),
+                           'c': 'purple', 'label': 'Light Hole Group', 's': 10, 'marker': 's'})
+
+        self.plot_specs.append({
+            'kind': 'bands',
+            'filename': f'{self.directory}/band_structure.png',
+            'title': 'Band Structure',
+            'xlabel': r'$k$ ($\pi/a$)',
+            'layers': layers,
+            'mean_energy': self.mean_energy,
+        })
+
+    def run(self, render=True):
+        """
+        Fits the heavy and light hole bands and collects their figures.
+
+        :param render: If True, render the collected figures immediately. Otherwise they are left in
+                       self.plot_specs, e.g. to be rendered for a whole sweep with plot_renderer.render_all.
+        """
+        start_time = time.time()
         # Pull in data
         df = pd.read_csv(self.filepath)
 
@@ -170,17 +186,20 @@ class EffectiveMassCalculator:
         self.best_fit_convergence_plot(df, band_type='light hole')
         self.plot_bands(df)
 
-if __name__ == "__main__":
+        if self.catalog is not None:
+            self.catalog.record_timing(os.path.dirname(os.path.abspath(self.filepath)), 'effmass',
+                                       time.time() - start_time, segment_name=segment_name_from_file(self.filepath))
 
+        if render:
+            render_all(self.plot_specs, workers=1)
 
-    # Argument parsing setup
-    parser = argparse.ArgumentParser(description='Effective Mass Calculator for specific band path.')
-    parser.add_argument('--csv_dir', type=str, required=True, help='Directory containing the band structure CSV files.')
-    parser.add_argument('--max_valence_symbol', type=str, default='Γ', help='Symbol of the maximum valence point (default: Γ).')
-    parser.add_argument('--mu', type=float, required=True, help='Pre-calculated mean energy value to use instead of calculating from centroids.')
-    parser.add_argument('--sep_limits', type=float, nargs=2, default=[-3, 3], help='Energy range limits for separation calculation (valence and conduction bands).')
+def run_effective_mass_calculations(args, catalog=None):
+    """
+    Runs the effective mass calculator on every file involving the maximum valence point
+    (see User.parser.add_effmass_arguments) and renders their figures in a process pool.
 
-    args = parser.parse_args()
+    :param catalog: ResultsCatalog the fits are recorded in, or None to skip recording.
+    """
     csv_dir = os.path.join(os.getcwd(),args.csv_dir)
     
     #Mapping between k_vector and symbol
@@ -212,11 +231,30 @@ if __name__ == "__main__":
 
     # Run effective mass calculations
     percentage_windows = [1,2,3,4,5]
+    plot_specs = []
     for filename in relevant_files:
         filepath = os.path.join(args.csv_dir, filename)
         print(f"Processing {filepath}...")
 
-        # Initialize and run EffectiveMassCalculator
-        calculator = EffectiveMassCalculator(filepath, percentage_windows,args.mu, args.sep_limits,max_valence_k)
-        calculator.run()
+        # Initialize and run EffectiveMassCalculator, deferring the figures
+        calculator = EffectiveMassCalculator(filepath, percentage_windows,args.mu, args.sep_limits,max_valence_k, catalog)
+        calculator.run(render=False)
+        plot_specs.extend(calculator.plot_specs)
+
+    # Render the figures of every file in a process pool
+    start_time = time.time()
+    render_all(plot_specs, args.workers)
+    if catalog is not None:
+        catalog.record_timing(csv_dir, 'render', time.time() - start_time)
+
+if __name__ == "__main__":
+
 
+    # Argument parsing setup
+    parser = argparse.ArgumentParser(description='Effective Mass Calculator for specific band path.')
+    add_effmass_arguments(parser)
+    add_catalog_option(parser)
+
+    args = parser.parse_args()
+    with catalog_from_args(args) as catalog:
+        run_effective_mass_calculations(args, catalog)
@@ -0,0 +1,149 @@
+import matplotlib
+from matplotlib.figure import Figure
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Mathtext with Computer Modern fonts gives LaTeX style labels without starting an external LaTeX process.
+# Only applied while a figure is rendered, so importing this module leaves the global matplotlib state alone.
+RC_PARAMS = {'mathtext.fontset': 'cm', 'font.family': 'serif'}
+
+FIGSIZE = (10, 8)
+DPI = 100
+
+
+def downsample_points(x, y, xlim=None, ylim=None, figsize=FIGSIZE, dpi=DPI, pixel_size=1):
+    """
+    Drops points that would be drawn on the same pixel of the output image, keeping the first point of each pixel.
+    Points outside xlim / ylim are dropped as they would not be visible.
+
+    :param x: Array of x values.
+    :param y: Array of y values.
+    :param xlim: (min, max) of the x axis, defaults to the data range.
+    :param ylim: (min, max) of the y axis, defaults to the data range.
+    :param figsize: Figure size in inches.
+    :param dpi: Output resolution in dots per inch.
+    :param pixel_size: Size of the grid cells points are merged within, in pixels.
+    :return: The downsampled x and y arrays.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) == 0:
+        return x, y
+    xlim = xlim if xlim is not None else (x.min(), x.max())
+    ylim = ylim if ylim is not None else (y.min(), y.max())
+    inside = (x >= xlim[0]) & (x <= xlim[1]) & (y >= ylim[0]) & (y <= ylim[1])
+    x, y = x[inside], y[inside]
+
+    # The whole figure is used as the grid, which is finer than the axes and so never merges distinct pixels
+    width_px = max(int(figsize[0] * dpi / pixel_size), 1)
+    height_px = max(int(figsize[1] * dpi / pixel_size), 1)
+    x_span = (xlim[1] - xlim[0]) or 1
+    y_span = (ylim[1] - ylim[0]) or 1
+    ix = ((x - xlim[0]) / x_span * (width_px - 1)).round().astype(np.int64)
+    iy = ((y - ylim[0]) / y_span * (height_px - 1)).round().astype(np.int64)
+    _, keep = np.unique(ix * height_px + iy, return_index=True)
+    keep.sort()
+    return x[keep], y[keep]
+
+
+def scatter_layer(ax, x, y, xlim=None, ylim=None, **kwargs):
+    """Draws a downsampled, rasterized scatter layer."""
+    x, y = downsample_points(x, y, xlim, ylim)
+    ax.scatter(x, y, rasterized=True, **kwargs)
+
+
+def render_bands(spec):
+    """
+    Renders a band structure plot.
+
+    Expected spec keys: 'filename', 'title', 'xlabel', 'layers' (a list of dicts with 'x', 'y' and scatter keyword
+    arguments) and optionally 'mean_energy', 'segment_lines' (x positions of segment points), 'segment_labels',
+    'ylim'.
+    """
+    # Not registered with pyplot, so it renders headlessly and is freed without plt.close
+    fig = Figure(figsize=FIGSIZE)
+    ax = fig.subplots()
+    ylim = spec.get('ylim')
+    for layer in spec['layers']:
+        layer = dict(layer)
+        scatter_layer(ax, layer.pop('x'), layer.pop('y'), ylim=ylim, **layer)
+    if spec.get('mean_energy') is not None:
+        ax.axhline(y=spec['mean_energy'], color='grey', linestyle='--', label='Mean Energy')
+    for position in spec.get('segment_lines', []):
+        ax.axvline(x=position, color='black', linewidth=0.5)
+    if spec.get('segment_labels'):
+        ax.set_xticks(spec['segment_lines'])
+        ax.set_xticklabels(spec['segment_labels'])
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    ax.set_xlabel(spec['xlabel'], fontsize=14)
+    ax.set_ylabel('Energy (E) [eV]', fontsize=14)
+    ax.set_title(spec['title'], fontsize=16)
+    ax.legend()
+    ax.grid(True)
+    fig.tight_layout()
+    fig.savefig(spec['filename'], dpi=DPI)
+
+
+def render_fit(spec):
+    """
+    Renders the best parabola fit of a band.
+
+    Expected spec keys: 'filename', 'title', 'k', 'E', 'k_fit', 'E_fit', 'points_label', 'fit_label'.
+    """
+    fig = Figure(figsize=FIGSIZE)
+    ax = fig.subplots()
+    scatter_layer(ax, spec['k'], spec['E'], c='blue', label=spec['points_label'])
+    ax.plot(spec['k_fit'], spec['E_fit'], 'r-', label=spec['fit_label'])
+    ax.set_xlabel(r'$k$ ($\sqrt{k_x^2 + k_y^2 + k_z^2}$)', fontsize=14)
+    ax.set_ylabel('Energy (E) [eV]', fontsize=14)
+    ax.set_title(spec['title'], fontsize=16)
+    ax.legend()
+    ax.grid(True)
+    fig.savefig(spec['filename'], dpi=DPI)
+
+
+def render_convergence(spec):
+    """
+    Renders the fitting error as a function of the window percentage.
+
+    Expected spec keys: 'filename', 'title', 'percentage_windows', 'errors', 'label'.
+    """
+    fig = Figure(figsize=FIGSIZE)
+    ax = fig.subplots()
+    ax.plot(spec['percentage_windows'], spec['errors'], 'bo-', label=spec['label'])
+    ax.set_xlabel('Window Size (Percent)')
+    ax.set_ylabel('Fitting Error', fontsize=14)
+    ax.set_title(spec['title'])
+    ax.legend()
+    ax.grid(True)
+    fig.savefig(spec['filename'], dpi=DPI)
+
+
+RENDERERS = {
+    'bands': render_bands,
+    'fit': render_fit,
+    'convergence': render_convergence,
+}
+
+
+def render_figure(spec):
+    """Renders a single figure spec, dispatching on its 'kind', and returns the saved filename."""
+    with matplotlib.rc_context(RC_PARAMS):
+        RENDERERS[spec['kind']](spec)
+    print(f"Plot saved to {spec['filename']}")
+    return spec['filename']
+
+
+def render_all(specs, workers=None):
+    """
+    Renders a list of figure specs, in a pool of worker processes when there is more than one.
+
+    :param specs: A list of figure spec dictionaries, each with a 'kind' key of 'bands', 'fit' or 'convergence'.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :return: A list of the saved filenames.
+    """
+    if len(specs) <= 1 or workers == 1:
+        return [render_figure(spec) for spec in specs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_figure, specs))
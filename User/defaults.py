@@ -0,0 +1,6 @@
+# Defaults shared by the command line arguments and the functions implementing them. This module must stay free of
+# heavy imports, as User.parser imports it to build the command line interface.
+
+DEFAULT_CHUNK_SIZE = 100000  # Number of rows parsed and written at a time by csv_ascii_converter.py
+ENERGY_DTYPE_NAMES = ('float16', 'float32', 'float64')  # Precisions the eigenvalues of a compact file can be stored with
+DEFAULT_ENERGY_DTYPE = 'float32'
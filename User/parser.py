@@ -1,29 +1,102 @@
-
 import argparse
+from User.defaults import DEFAULT_CHUNK_SIZE, ENERGY_DTYPE_NAMES, DEFAULT_ENERGY_DTYPE
 
-def parse_args():
-    """
-    Parse command line arguments to determine the k-space path and other configurations specified by the user.
-    The user will pass in a sequence of points in k-space, such as 'G X L',
-    where 'G' stands for Gamma, 'X', 'L', etc., represent standard points in the Brillouin zone.
-    Additionally, the user can specify the path to the XML template file and the output directory.
-    """
-    parser = argparse.ArgumentParser(description='Parse user options for the k-space setup')
-    # Define the expected command-line arguments
+# Argument definitions only depend on argparse, so the command line interface can be built without importing
+# pandas, matplotlib, scikit-learn or scipy. Each add_*_arguments function is shared by the corresponding script
+# and the mpbcalc.py subcommand.
+
+def add_catalog_option(parser):
+    """Adds the arguments selecting the results catalog a pipeline stage records its outputs in."""
+    parser.add_argument('--catalog', type=str,
+                        help='Path to the results catalog database (default: $MPBCALC_CATALOG or ./results_catalog.db)')
+    parser.add_argument('--no_catalog', action='store_true',
+                        help='Do not record this stage in the results catalog')
+
+def add_generate_arguments(parser):
+    """Adds the arguments used to generate the XML files of a k-space path."""
     parser.add_argument('-p', '--path', type=str, default='G,X,L',
                     help='A sequence of points in k-space separated by commas, e.g., "G,X,L"')
     parser.add_argument('-o', '--output', type=str, default='BSNewOutput',
                         help='Relative output directory where the updated XML files will be saved')
     parser.add_argument('-x', '--xml_template', type=str, required=True,
                         help='The path to the XML template file to be used for generating new XML files')
+
+def add_submit_arguments(parser, include_output=True):
+    """Adds the arguments used to submit the jobs of a generated output directory."""
+    if include_output:
+        parser.add_argument('-o', '--output', type=str, default='BSNewOutput',
+                            help='Relative output directory containing the generated XML files')
     parser.add_argument('-j', '--job_directory', type=str, default='./jobs',
                         help='Directory to store job scripts and outputs')
     parser.add_argument('-e', '--executable', type=str, default='/g/data/ad73/codes/NEMO3D_original/NEMO_3D/nemo3d/bin/nemo3d-x86_64_intel20_64_openmpi_gadi.ex',
                         help='Path to the NEMO3D executable')
     parser.add_argument('-f', '--post_process_script', type=str, default='./fmtdat.ex',
                         help='Path to the post-processing script')
-    
+    parser.add_argument('-b', '--batch_convert', action='store_true',
+                        help='Convert all ASCII files to CSV in one pass once the jobs complete, rather than inside each job')
+
+def add_track_arguments(parser):
+    """Adds the arguments used to check on submitted jobs."""
+    parser.add_argument('-j', '--job_directory', type=str, default='./jobs',
+                        help='Directory containing the job scripts and the job_state.json written on submission')
+    parser.add_argument('-w', '--wait', action='store_true',
+                        help='Wait for all jobs to complete, then convert (if submitted with --batch_convert) and combine the results')
+
+def add_convert_arguments(parser):
+    """Adds the arguments used to convert .nd_Ek_ascii files to CSV."""
+    parser.add_argument('file_path', type=str, nargs='?', help='Path to the .nd_Ek_ascii file.')
+    parser.add_argument('-b', '--batch', type=str, help='Convert every .nd_Ek_ascii file in this directory.')
+    parser.add_argument('-w', '--workers', type=int, help='Number of worker processes used in batch mode.')
+    parser.add_argument('-c', '--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE, help='Number of rows held in memory at once.')
+
+def add_combine_arguments(parser):
+    """Adds the arguments used to combine the segment CSV files of a run."""
+    parser.add_argument('-dir','--directory',type=str, help='Path to the directory containing CSV files and args.json')
+    parser.add_argument('--compact', action='store_true', help='Save a compact .npz file of segment endpoints, float32 path parameters and eigenvalues instead of a CSV file')
+    parser.add_argument('--energy_dtype', type=str, default=DEFAULT_ENERGY_DTYPE, choices=ENERGY_DTYPE_NAMES, help='Precision of the eigenvalues in the compact file')
+
+def add_analyze_arguments(parser):
+    """Adds the arguments of the bandstructure viewer."""
+    parser.add_argument('--csv_local_dir', type=str, required=True, help='Local relative directory of the combined CSV (or compact .npz) file.')
+    parser.add_argument('--sep_limits', type=float, nargs=2, default=[-3, 3], help='Energy range limits for separation calculation (valence and conduction bands).')
+    parser.add_argument('--plot_limits', type=float, nargs=2, help='Energy range limits for plotting. If not provided, sep_limits will be used.')
+    parser.add_argument('--save_dir', type=str, required=True, help='Directory where the plot should be saved.')
+    parser.add_argument('--plot_title', type=str, required=True, help='Title of Plot')
+
+def add_effmass_arguments(parser):
+    """Adds the arguments of the effective mass calculator."""
+    parser.add_argument('--csv_dir', type=str, required=True, help='Directory containing the band structure CSV files.')
+    parser.add_argument('--max_valence_symbol', type=str, default='Γ', help='Symbol of the maximum valence point (default: Γ).')
+    parser.add_argument('--mu', type=float, required=True, help='Pre-calculated mean energy value to use instead of calculating from centroids.')
+    parser.add_argument('--sep_limits', type=float, nargs=2, default=[-3, 3], help='Energy range limits for separation calculation (valence and conduction bands).')
+    parser.add_argument('--workers', type=int, help='Number of processes used to render the figures (default: number of CPUs).')
+
+def add_catalog_arguments(parser):
+    """Adds the arguments used to query the results catalog."""
+    parser.add_argument('--db', type=str, help='Path to the catalog database (default: $MPBCALC_CATALOG or ./results_catalog.db).')
+    parser.add_argument('--material', type=str, help='Material of the template, e.g. "InSb".')
+    parser.add_argument('--title', type=str, help='Title stored in args.json, e.g. "In".')
+    parser.add_argument('--template_hash', type=str, help='(Prefix of the) SHA-256 hash of the XML template.')
+    parser.add_argument('-p', '--path', type=str, help='Symbolic k-space path, e.g. "G,X,L".')
+    parser.add_argument('--nk', type=int, help='Number of k points per segment.')
+    parser.add_argument('--min_gap', type=float, help='Lower limit on the bandgap energy [eV].')
+    parser.add_argument('--max_gap', type=float, help='Upper limit on the bandgap energy [eV].')
+    parser.add_argument('--segments', action='store_true', help='Also list the segments of each matching run.')
+    parser.add_argument('--timings', action='store_true', help='Also list the stage timings of each matching run.')
+
+def parse_args():
+    """
+    Parse command line arguments to determine the k-space path and other configurations specified by the user.
+    The user will pass in a sequence of points in k-space, such as 'G X L',
+    where 'G' stands for Gamma, 'X', 'L', etc., represent standard points in the Brillouin zone.
+    Additionally, the user can specify the path to the XML template file and the output directory.
+    """
+    parser = argparse.ArgumentParser(description='Parse user options for the k-space setup')
+    # Define the expected command-line arguments
+    add_generate_arguments(parser)
+    add_submit_arguments(parser, include_output=False)
+    add_catalog_option(parser)
 
     # Parse the command line arguments
     args = parser.parse_args()
-    return args
\ No newline at end of file
+    return args
@@ -1,41 +1,167 @@
 import os
-import pandas as pd
-import sys  # Importing sys to read command-line arguments
+import time
+from itertools import islice
+from Catalog.catalog import catalog_from_args, segment_name_from_file
+from User.defaults import DEFAULT_CHUNK_SIZE
+
+COLUMNS = ['kx', 'ky', 'kz', 'E']
+HEADER_ROWS = 5  # Number of header rows written by fmtdat before the dispersion data
 
 def read_ascii_file(file_path):
     """
     Reads the ASCII file, skipping the first 5 rows and using whitespace as delimiter.
     Returns a DataFrame with column names for dispersion data.
     """
-    df = pd.read_csv(file_path, skiprows=5, delim_whitespace=True, header=None, names=['kx', 'ky', 'kz', 'E'])
+    import pandas as pd
+    df = pd.read_csv(file_path, skiprows=HEADER_ROWS, sep=r'\s+', header=None, names=COLUMNS)
     return df
 
-def process_file_and_save_csv(file_path):
+def convert_ascii_to_csv(file_path, csv_file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams an ASCII dispersion file into a CSV file, parsing at most chunk_size rows at a time
+    so memory use is bounded regardless of the number of eigenvalues per k point.
+    The CSV file is written under a temporary name and only moved into place once the whole file converted,
+    so a malformed or truncated ASCII file never leaves a partial CSV file behind.
+
+    :param file_path: Full path to the ASCII file.
+    :param csv_file_path: Full path to the CSV file to write.
+    :param chunk_size: Number of rows held in memory at once.
+    :return: The number of data rows written.
+    :raises: ValueError if a row does not contain exactly kx, ky, kz and E.
+    """
+    temp_file_path = f"{csv_file_path}.tmp"
+    try:
+        n_rows = _write_csv(file_path, temp_file_path, chunk_size)
+        os.replace(temp_file_path, csv_file_path)
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+    return n_rows
+
+def _write_csv(file_path, csv_file_path, chunk_size):
+    """Writes the rows of an ASCII dispersion file to a CSV file, see convert_ascii_to_csv."""
+    n_rows = 0
+    with open(file_path, 'r') as ascii_file, open(csv_file_path, 'w') as csv_file:
+        csv_file.write(','.join(COLUMNS) + '\n')
+        lines = islice(ascii_file, HEADER_ROWS, None)
+        line_number = HEADER_ROWS
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                break
+            rows = []
+            for line in chunk:
+                line_number += 1
+                values = line.split()
+                if not values:
+                    continue  # Skip blank lines, as pandas does
+                if len(values) != len(COLUMNS):
+                    raise ValueError(f"{file_path}:{line_number}: expected {len(COLUMNS)} columns, found {len(values)}")
+                float_values = [float(value) for value in values]  # Validate the row before writing it
+                rows.append(','.join(map(repr, float_values)))
+            if rows:
+                csv_file.write('\n'.join(rows) + '\n')
+            n_rows += len(rows)
+    return n_rows
+
+def convert_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
     """
-    Processes a single .nd_Ek_ascii file with read_ascii_file, and saves it as a CSV file with the same name.
-    
+    Converts a single .nd_Ek_ascii file with convert_ascii_to_csv, saving it as a CSV file with the same name.
+
     :param file_path: Full path to the ASCII file.
+    :param chunk_size: Number of rows held in memory at once.
+    :return: A (csv_file_path, n_rows, seconds) tuple, or None if the file was not converted.
     """
+    folder_path, file_name = os.path.split(file_path)
     # Check if the file ends with the .nd_Ek_ascii extension
     if file_path.endswith(".nd_Ek_ascii"):
-        # Read the file into a DataFrame
-        df = read_ascii_file(file_path)
-        
+        start_time = time.time()
+
         # Construct the CSV file name by replacing the extension
-        folder_path, file_name = os.path.split(file_path)
         csv_file_name = file_name.replace('.nd_Ek_ascii', '.csv')
         csv_file_path = os.path.join(folder_path, csv_file_name)
-        
-        # Save the DataFrame to a CSV file
-        df.to_csv(csv_file_path, index=False)
+
+        # Stream the ASCII file into the CSV file
+        n_rows = convert_ascii_to_csv(file_path, csv_file_path, chunk_size)
         print(f"Saved CSV file: {csv_file_name}")
+        return csv_file_path, n_rows, time.time() - start_time
     else:
         print(f"The file {file_name} does not end with .nd_Ek_ascii")
+        return None
+
+def record_conversion(catalog, file_path, result):
+    """Records a conversion returned by convert_file in the results catalog."""
+    if catalog is not None and result is not None:
+        csv_file_path, n_rows, seconds = result
+        catalog.record_segment_csv(file_path, csv_file_path, n_rows)
+        catalog.record_timing(os.path.dirname(file_path), 'convert', seconds, segment_name=segment_name_from_file(csv_file_path))
+
+def process_file_and_save_csv(file_path, chunk_size=DEFAULT_CHUNK_SIZE, catalog=None):
+    """
+    Processes a single .nd_Ek_ascii file with convert_file, and saves it as a CSV file with the same name.
+
+    :param file_path: Full path to the ASCII file.
+    :param chunk_size: Number of rows held in memory at once.
+    :param catalog: ResultsCatalog the conversion is recorded in, or None to skip recording.
+    :return: The path of the saved CSV file, or None if the file was not converted.
+    """
+    result = convert_file(file_path, chunk_size)
+    record_conversion(catalog, file_path, result)
+    return result[0] if result is not None else None
+
+def process_directory(directory, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, catalog=None):
+    """
+    Converts every .nd_Ek_ascii file in a directory to CSV using a pool of worker processes,
+    paying the interpreter start up cost once rather than once per segment.
+
+    :param directory: Directory containing the ASCII files.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :param chunk_size: Number of rows held in memory at once by each worker.
+    :param catalog: ResultsCatalog the conversions are recorded in, or None to skip recording.
+    :return: A list of the saved CSV file paths.
+    :raises: RuntimeError once the successful conversions are recorded, if any file failed to convert.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    file_paths = sorted(os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                        if file_name.endswith('.nd_Ek_ascii'))
+    if not file_paths:
+        print(f"No .nd_Ek_ascii files found in {directory}")
+        return []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convert_file, file_path, chunk_size) for file_path in file_paths]
+
+        # Only this process writes to the catalog, the workers just convert
+        csv_file_paths, failed = [], []
+        for file_path, future in zip(file_paths, futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                print(f"Failed to convert {file_path}: {error}")
+                failed.append(file_path)
+                continue
+            record_conversion(catalog, file_path, result)
+            if result is not None:
+                csv_file_paths.append(result[0])
+    if failed:
+        raise RuntimeError(f"Failed to convert {len(failed)} of {len(file_paths)} files in {directory}")
+    return csv_file_paths
+
+def convert(args):
+    """Converts a single file or, in batch mode, a whole directory (see User.parser.add_convert_arguments)."""
+    with catalog_from_args(args) as catalog:
+        if args.batch:
+            process_directory(args.batch, args.workers, args.chunk_size, catalog)
+        # Check if a file path was provided
+        elif args.file_path:
+            process_file_and_save_csv(args.file_path, args.chunk_size, catalog)
+        else:
+            print("Please provide the path to the .nd_Ek_ascii file.")
 
 if __name__ == "__main__":
-    # Check if a file path was provided
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]  # Get the file path from command-line arguments
-        process_file_and_save_csv(file_path)
-    else:
-        print("Please provide the path to the .nd_Ek_ascii file.")
+    import argparse
+    from User.parser import add_convert_arguments, add_catalog_option
+
+    parser = argparse.ArgumentParser(description='Convert NEMO3D .nd_Ek_ascii files to CSV.')
+    add_convert_arguments(parser)
+    add_catalog_option(parser)
+    convert(parser.parse_args())
@@ -2,7 +2,11 @@ import json
 import pandas as pd
 import os
 import glob  # Import glob module to find all the pathnames matching a specified pattern
-import argparse
+import time
+from Catalog.catalog import catalog_from_args
+from KSpace.kspacesetup import segment_name
+from BandData.compact import CompactBandStructure, ENERGY_DTYPES
+from User.defaults import DEFAULT_ENERGY_DTYPE
 
 # Define mapping from symbols to k values
 symmetry_points = {
@@ -32,21 +36,27 @@ def create_file_names_from_k_pairs(base_name, k_pairs):
     """
     file_names = []
     for initial_k, final_k in k_pairs:
-        file_name = f"{base_name}_{'_'.join(map(str, initial_k))}to{'_'.join(map(str, final_k))}.csv"
+        file_name = f"{segment_name(base_name, initial_k, final_k)}.csv"
         file_names.append(file_name)
     return file_names
 
 def combine_csv_files(file_paths, k_pairs):
+    """
+    Combines the segment CSV files, marking the start and end point of each segment.
+    Returns the combined DataFrame and the number of rows of each segment.
+    """
     combined_df = pd.DataFrame()
+    segment_lengths = []
     for i, file_path in enumerate(file_paths):
         df = pd.read_csv(file_path)
+        segment_lengths.append(len(df))
         # Assign the segment start and end points to the first and last row respectively
         df['Segment_Point'] = ''  # Initialize the column with empty strings
         if not df.empty:  # Check if the DataFrame is not empty
             df.at[0, 'Segment_Point'] = str(k_pairs[i][0])  # Set start of segment
             df.at[len(df) - 1, 'Segment_Point'] = str(k_pairs[i][1])  # Set end of segment
         combined_df = pd.concat([combined_df, df], ignore_index=True)
-    return combined_df
+    return combined_df, segment_lengths
 
 def find_first_csv_file(base_path):
     """
@@ -64,7 +74,16 @@ def extract_title_from_file_name(file_name):
     title = base_name.split('_')[0] # Remove the last three elements (k-point segment)
     return title
 
-def run_combination_process(base_path):
+def run_combination_process(base_path, compact=False, energy_dtype=DEFAULT_ENERGY_DTYPE, catalog=None):
+    """
+    Combines the segment CSV files of a run into a combined CSV file, or a compact .npz file.
+
+    :param base_path: Directory containing the CSV files and args.json.
+    :param compact: If True, save a compact .npz file instead of a CSV file.
+    :param energy_dtype: Precision of the eigenvalues in the compact file.
+    :param catalog: ResultsCatalog the segments and combined file are recorded in, or None to skip recording.
+    """
+    start_time = time.time()
     # Read configuration
     config = read_json_config(f'{base_path}/args.json')
 
@@ -80,18 +99,41 @@ def run_combination_process(base_path):
     k_pairs = symbolic_path_to_k_pairs(symbolic_path)
     csv_files = create_file_names_from_k_pairs(f'{base_path}/{title}', k_pairs)
     
-    # Combine CSV files
-    combined_df = combine_csv_files(csv_files,k_pairs)
-    
-    # Save the combined DataFrame
-    combined_df.to_csv(f'{base_path}/{title}_combined.csv', index=False)
-    print(f'Combined CSV file saved to {base_path}/{title}_combined.csv')
+    if compact:
+        # Store segment endpoints once and a path parameter per k, reading one segment at a time
+        combined_file = f'{base_path}/{title}_combined.npz'
+        compact_data = CompactBandStructure.from_segment_frames((pd.read_csv(file_path) for file_path in csv_files),
+                                                                k_pairs, ENERGY_DTYPES[energy_dtype])
+        compact_data.save(combined_file)
+        segment_lengths = compact_data.segment_lengths
+        print(f'Compact combined file saved to {combined_file}')
+    else:
+        # Combine CSV files
+        combined_df, segment_lengths = combine_csv_files(csv_files,k_pairs)
+
+        # Save the combined DataFrame
+        combined_file = f'{base_path}/{title}_combined.csv'
+        combined_df.to_csv(combined_file, index=False)
+        print(f'Combined CSV file saved to {combined_file}')
+
+    # Record the segments (converted inside the jobs without a catalog) and the combined file
+    if catalog is not None:
+        for csv_file, n_rows in zip(csv_files, segment_lengths):
+            catalog.record_segment_csv(f'{csv_file[:-len(".csv")]}.nd_Ek_ascii', csv_file, int(n_rows))
+        catalog.record_combined_csv(base_path, combined_file)
+        catalog.record_timing(base_path, 'combine', time.time() - start_time)
+
 
 
+if __name__ == '__main__':
+    import argparse
+    from User.parser import add_combine_arguments, add_catalog_option
 
-#Parse argument
-parser = argparse.ArgumentParser(description='Combine CSV files based on k-value pairs.')
-parser.add_argument('-dir','--directory',type=str, help='Path to the directory containing CSV files and args.json')
-args = parser.parse_args()
+    #Parse argument
+    parser = argparse.ArgumentParser(description='Combine CSV files based on k-value pairs.')
+    add_combine_arguments(parser)
+    add_catalog_option(parser)
+    args = parser.parse_args()
 
-run_combination_process(args.directory)
+    with catalog_from_args(args) as catalog:
+        run_combination_process(args.directory, args.compact, args.energy_dtype, catalog)
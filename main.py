@@ -1,49 +1,78 @@
-import argparse
-from KSpace.kspacesetup import KSpaceSetup,update_k_vectors
+from KSpace.kspacesetup import KSpaceSetup,update_k_vectors,pull_name,pull_material,pull_nk
 from Job.job_manager import JobManager
 from User.parser import parse_args
+from Catalog.catalog import catalog_from_args, default_catalog_path
 import os
+import time
 
-def main():
-    """
-    Main function to execute the script logic. It parses user input, converts the symbolic k-space path
-    to k-value pairs, and updates XML files accordingly.
-    """
-    ### SETUP XML FILES
-
-    # Define relevant symettry points for KSpaceSetup
-    symmetry_points = {
+# Define relevant symettry points for KSpaceSetup
+symmetry_points = {
     'Γ': (0, 0, 0),  # Gamma point
     'X': (0, 2, 0),  # X point, considering 2π/a as 1 for simplicity
     'L': (1, 1, 1),  # L point
     'W': (1, 2, 0),  # W point
     'U': (0.5, 2, 0.5),  # U point
     'K': (1.5, 1.5, 0),  # K point
-    }
-    k_space_setup = KSpaceSetup(symmetry_points=symmetry_points)
+}
 
-    # Parse the command line arguments
-    user_defined_args = parse_args()
+def generate(user_defined_args, catalog=None):
+    """
+    Converts the user defined symbolic k-space path to k-value pairs and writes an XML file for each segment.
+
+    :param user_defined_args: Parsed arguments, see User.parser.add_generate_arguments.
+    :param catalog: ResultsCatalog the generated run is recorded in, or None to skip recording.
+    """
+    k_space_setup = KSpaceSetup(symmetry_points=symmetry_points)
 
     # Convert the user defined symbolic path to the format required by KSpaceSetup
     path_symbols = user_defined_args.path.replace('G','Γ').split(',')    
     k_values_path = k_space_setup.symbolic_path_to_k_pairs(path_symbols)
 
     # Update the XML files based on the user-defined k-space path
+    start_time = time.time()
     xml_file_path = os.path.join(os.getcwd(),user_defined_args.xml_template)
     update_k_vectors(xml_file_path, k_values_path, user_defined_args.output, path_symbols)
 
-    # Manage the jobs: submit, track, and combine
-    job_manager = JobManager(
+    # Record the generated run in the results catalog
+    if catalog is not None:
+        catalog.register_run(user_defined_args.output, xml_file_path, pull_name(xml_file_path),
+                             pull_material(xml_file_path), path_symbols, pull_nk(xml_file_path), k_values_path)
+        catalog.record_timing(user_defined_args.output, 'generate', time.time() - start_time)
+
+def create_job_manager(user_defined_args):
+    """
+    Creates the JobManager for the XML files of a generated output directory.
+
+    :param user_defined_args: Parsed arguments, see User.parser.add_submit_arguments and add_catalog_option.
+    """
+    # Resolve the catalog now, as tracking may run later from another directory (JobManager does the same for its paths)
+    catalog_path = None if user_defined_args.no_catalog else os.path.abspath(user_defined_args.catalog or default_catalog_path())
+    return JobManager(
     xml_directory=user_defined_args.output,
     job_directory=user_defined_args.job_directory,
     executable=user_defined_args.executable,
     post_process_script=user_defined_args.post_process_script,
-    combiner_script='csv_combiner.py',  # Path to your CSV combining script
-    combiner_directory=user_defined_args.output  # Directory where the combined CSV should be saved
+    combiner_directory=user_defined_args.output,  # Directory where the combined CSV should be saved
+    batch_convert=user_defined_args.batch_convert,
+    catalog_path=catalog_path
     )
+
+def main():
+    """
+    Main function to execute the script logic. It parses user input, converts the symbolic k-space path
+    to k-value pairs, and updates XML files accordingly.
+    """
+    # Parse the command line arguments
+    user_defined_args = parse_args()
+
+    ### SETUP XML FILES
+    with catalog_from_args(user_defined_args) as catalog:
+        generate(user_defined_args, catalog)
+
+    # Manage the jobs: submit, track, and combine
+    job_manager = create_job_manager(user_defined_args)
     job_manager.manage_jobs()
     
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
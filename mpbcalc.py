@@ -0,0 +1,93 @@
+import argparse
+from User.parser import (add_generate_arguments, add_submit_arguments, add_track_arguments, add_convert_arguments,
+                         add_combine_arguments, add_analyze_arguments, add_effmass_arguments, add_catalog_arguments,
+                         add_catalog_option)
+
+# Each subcommand imports its module only when it runs, so quick commands such as convert and track
+# never pay for importing pandas, matplotlib, scikit-learn or scipy.
+
+def run_generate(args):
+    from main import generate
+    from Catalog.catalog import catalog_from_args
+    with catalog_from_args(args) as catalog:
+        generate(args, catalog)
+
+def run_submit(args):
+    from main import create_job_manager
+    job_manager = create_job_manager(args)
+    job_manager.submit_jobs()
+    print(f"Submitted {len(job_manager.job_ids)} jobs, check on them with: python mpbcalc.py track -j {args.job_directory}")
+
+def run_track(args):
+    from Job.job_manager import JobManager
+    job_manager = JobManager.from_state(args.job_directory)
+    if args.wait:
+        job_manager.track_and_combine_jobs()
+    else:
+        job_manager.report_status()
+
+def run_pipeline(args):
+    from main import generate, create_job_manager
+    from Catalog.catalog import catalog_from_args
+    with catalog_from_args(args) as catalog:
+        generate(args, catalog)
+    create_job_manager(args).manage_jobs()
+
+def run_convert(args):
+    from csv_ascii_converter import convert
+    convert(args)
+
+def run_combine(args):
+    from csv_combiner import run_combination_process
+    from Catalog.catalog import catalog_from_args
+    with catalog_from_args(args) as catalog:
+        run_combination_process(args.directory, args.compact, args.energy_dtype, catalog)
+
+def run_analyze(args):
+    from PostProcessing.combination_csv_plotter import BandStructureAnalyzer
+    from Catalog.catalog import catalog_from_args
+    with catalog_from_args(args) as catalog:
+        BandStructureAnalyzer(args, catalog).run()
+
+def run_effmass(args):
+    from PostProcessing.eff_mass_calculator import run_effective_mass_calculations
+    from Catalog.catalog import catalog_from_args
+    with catalog_from_args(args) as catalog:
+        run_effective_mass_calculations(args, catalog)
+
+def run_catalog(args):
+    from Catalog.catalog import query_catalog
+    query_catalog(args)
+
+def build_parser():
+    """Builds the parser of the mpbcalc command line interface, with one subcommand per pipeline stage."""
+    parser = argparse.ArgumentParser(description='MultiPath Band Structure Calculator (MPBCalc).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subcommands = [
+        ('generate', 'Generate the XML files of a k-space path.', run_generate, [add_generate_arguments, add_catalog_option]),
+        ('submit', 'Submit a job for each generated XML file.', run_submit, [add_submit_arguments, add_catalog_option]),
+        ('track', 'Check on submitted jobs, or wait for them and combine the results.', run_track, [add_track_arguments]),
+        ('run', 'Generate, submit, track and combine in one go (as main.py).', run_pipeline,
+         [add_generate_arguments, lambda subparser: add_submit_arguments(subparser, include_output=False),
+          add_catalog_option]),
+        ('convert', 'Convert .nd_Ek_ascii files to CSV.', run_convert, [add_convert_arguments, add_catalog_option]),
+        ('combine', 'Combine the segment CSV files of a run.', run_combine, [add_combine_arguments, add_catalog_option]),
+        ('analyze', 'Find the bandgap of a combined band structure and plot it.', run_analyze,
+         [add_analyze_arguments, add_catalog_option]),
+        ('effmass', 'Fit the heavy and light hole effective masses.', run_effmass, [add_effmass_arguments, add_catalog_option]),
+        ('catalog', 'Query the results catalog.', run_catalog, [add_catalog_arguments]),
+    ]
+    for name, help_text, handler, add_arguments in subcommands:
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        for add in add_arguments:
+            add(subparser)
+        subparser.set_defaults(handler=handler)
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    args.handler(args)
+
+if __name__ == '__main__':
+    main()